@@ -2,13 +2,15 @@
 import asyncio
 import uvicorn
 from server import app
-from utils import api_call
+from utils import api_call, close_clients
 
 BASE_URL = "http://127.0.0.1:8000"
 
 async def main():
     # Start the server in the background
-    config = uvicorn.Config(app=app, host="0.0.0.0", port=8000)
+    # http="auto" picks the httptools C parser when installed, h11 otherwise
+    config = uvicorn.Config(app=app, host="0.0.0.0", port=8000,
+                            log_level="warning", access_log=False)
     server = uvicorn.Server(config=config)
     server_task = asyncio.create_task(server.serve())
 
@@ -31,8 +33,15 @@ async def main():
     )
     print(data)
 
+    await close_clients()
     server.should_exit = True
     await server_task
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # server.serve() runs on the caller's loop: use uvloop where it is installed
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
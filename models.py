@@ -1,9 +1,16 @@
 # models.py
 from sqlalchemy import Column, Date, Integer, String, Float, ForeignKey, Index, DateTime
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# SQLite stores server-side CURRENT_TIMESTAMP as "YYYY-MM-DD HH:MM:SS"; bind the
+# keyset cursor in the same text format so (created_at, id) comparisons hold
+_SQLITE_TIMESTAMP = sqlite.DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -31,7 +38,8 @@ class FreightSearch(Base):
 
     min_price = Column(Float, nullable=True, index=True)
     max_price = Column(Float, nullable=True, index=True)
-    pickup_code = Column(Integer, index=True, nullable=True)
+    # pickup_code lookups are served by idx_fs_route_recent (leading column)
+    pickup_code = Column(Integer, nullable=True)
     delivery_code = Column(Integer, index=True, nullable=True)
     pickup_date_from = Column(Date, nullable=True, index=True)
     pickup_date_to = Column(Date, nullable=True, index=True)
@@ -39,8 +47,9 @@ class FreightSearch(Base):
     delivery_date_to = Column(Date, nullable=True, index=True)
 
     # New: creation time for recency ordering (UTC on Postgres; SQLite uses local)
-    created_at = Column(DateTime(timezone=True), nullable=False,
-                        server_default=func.now(), index=True)
+    # Indexed through idx_fs_created_id, which leads with it
+    created_at = Column(DateTime(timezone=True).with_variant(_SQLITE_TIMESTAMP, "sqlite"), nullable=False,
+                        server_default=func.now())
 
     user = relationship("User", backref="freight_searches")
 
@@ -57,8 +66,40 @@ class FreightSearch(Base):
 # For 1M+ rows, PostgreSQL is recommended for best plans and filtered indexes.
 # ──────────────────────────────────────────────────────────────────────────────
 
-# Route index: typically the strongest filter
-Index("idx_fs_route", FreightSearch.pickup_code, FreightSearch.delivery_code)
+# Keyset paging: serves ORDER BY created_at DESC, id DESC and the
+# (created_at, id) < (before_ts, before_id) cursor straight from the index
+Index("idx_fs_created_id", FreightSearch.created_at.desc(), FreightSearch.id.desc())
+
+# Route + recency index (route is typically the strongest filter; this also
+# replaces the plain (pickup_code, delivery_code) and pickup_code indexes, which
+# were only its prefixes and cost extra writes per insert). find_matches' OR'd
+# route predicates reach it through bitmap scans, which always visit the heap,
+# so no INCLUDE payload: it would only add write and space cost
+Index(
+    "idx_fs_route_recent",
+    FreightSearch.pickup_code,
+    FreightSearch.delivery_code,
+    FreightSearch.created_at.desc(),
+    FreightSearch.id.desc(),
+)
+# Partial twin for "any pickup" searches: the pickup_code IS NULL branch of the
+# route predicate gets its own small index, BitmapOr'd with the one above
+Index(
+    "idx_fs_open_pickup_recent",
+    FreightSearch.delivery_code,
+    FreightSearch.created_at.desc(),
+    FreightSearch.id.desc(),
+    sqlite_where=FreightSearch.pickup_code.is_(None),
+    postgresql_where=FreightSearch.pickup_code.is_(None),
+)
+
+# "Any delivery" searches; the pickup side is served by the twin above
+Index(
+    "idx_fs_delivery_null",
+    FreightSearch.id,
+    sqlite_where=FreightSearch.delivery_code.is_(None),
+    postgresql_where=FreightSearch.delivery_code.is_(None),
+)
 
 # Partial indexes (no-op on MySQL)
 Index(
@@ -1,14 +1,18 @@
 # server.py
+from collections import OrderedDict
 from contextlib import asynccontextmanager
+import time
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
+import orjson
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import or_, and_
-from database import AsyncSessionLocal, engine, Base, get_db
+from sqlalchemy import Integer, and_, bindparam, or_, text
+from database import AsyncSessionLocal, engine, Base, get_db, FORCE_INDEX_SCAN, MATCH_JIT, MATCH_NO_SORT
 from models import Freight, Test, User, FreightSearch
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Optional
 from pydantic import BaseModel, ConfigDict, field_validator
 
 
@@ -17,9 +21,44 @@ async def lifespan(app: FastAPI):
     # Create tables + indexes
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # Index-shape planner hints for find_matches only make sense once the
+        # index each one leans on exists (create_all skips indexes on existing tables)
+        if conn.dialect.name == "postgresql":
+            found = await conn.execute(text(
+                "SELECT indexname FROM pg_indexes"
+                " WHERE indexname IN ('idx_fs_created_id', 'idx_fs_route_recent')"
+            ))
+            indexes = set(found.scalars())
+            app.state.planner_hints = _planner_hints(
+                "idx_fs_created_id" in indexes, "idx_fs_route_recent" in indexes
+            )
     yield
 
 
+def _planner_hints(created_id_index: bool, route_recent_index: bool):
+    """One statement applying the transaction-local planner settings for find_matches."""
+    settings = []
+    if MATCH_NO_SORT and created_id_index:
+        # The OR'd route predicates rule out ordered reads from the route
+        # index, so the only sort-free plan is walking idx_fs_created_id
+        # backwards and filtering every row: worth it only for lanes that
+        # match much of the recent table, not the BitmapOr + top-N default
+        settings.append(("enable_sort", "off"))
+    if FORCE_INDEX_SCAN and route_recent_index:
+        # The planner can still prefer BitmapOr over plain scans of the route
+        # indexes when it misestimates the OR selectivity
+        settings.append(("enable_bitmapscan", "off"))
+    if MATCH_JIT:
+        # JIT-compile the eight "col IS NULL OR col op value" filters; pays off
+        # only when many rows are filtered per page, compile time is per query
+        settings.append(("jit", "on"))
+        settings.append(("jit_above_cost", "0"))
+    if not settings:
+        return None
+    # set_config(..., true) == SET LOCAL, batched into a single round trip
+    return text("SELECT " + ", ".join(f"set_config('{name}', '{value}', true)" for name, value in settings))
+
+
 app = FastAPI(lifespan=lifespan)
 
 
@@ -101,13 +140,47 @@ async def create_freight(freight: FreightCreate, db: AsyncSession = Depends(get_
     db.add(freight_obj)
     await db.commit()
     await db.refresh(freight_obj)
+    # SQLite may reuse the id of a deleted row: never serve a stale entry for it
+    _freight_cache.pop(freight_obj.id, None)
     return freight_obj
 
 
-@app.get("/freights/", response_model=List[FreightResponse])
-async def list_freights(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Freight))
-    return result.scalars().all()
+# Read paths select only the response columns and return plain dicts through
+# orjson: no ORM instances and no response_model validation per row
+_FREIGHT_COLUMNS = (
+    Freight.id,
+    Freight.price,
+    Freight.pickup_code,
+    Freight.delivery_code,
+    Freight.pickup_date,
+    Freight.delivery_date,
+)
+_FREIGHT_SEARCH_COLUMNS = (
+    FreightSearch.id,
+    FreightSearch.user_id,
+    FreightSearch.min_price,
+    FreightSearch.max_price,
+    FreightSearch.pickup_code,
+    FreightSearch.delivery_code,
+    FreightSearch.pickup_date_from,
+    FreightSearch.pickup_date_to,
+    FreightSearch.delivery_date_from,
+    FreightSearch.delivery_date_to,
+    FreightSearch.created_at,
+)
+
+
+@app.get("/freights/", response_class=ORJSONResponse)
+async def list_freights(
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    # Bounded page instead of the whole table; id order keeps pages stable
+    result = await db.execute(
+        select(*_FREIGHT_COLUMNS).order_by(Freight.id).limit(limit).offset(offset)
+    )
+    return ORJSONResponse([dict(r) for r in result.mappings()])
 
 
 @app.post("/freight_searches/", response_model=FreightSearchResponse)
@@ -122,80 +195,160 @@ async def create_freight_search(search: FreightSearchCreate, db: AsyncSession =
     return search_obj
 
 
-@app.get("/freight_searches/", response_model=List[FreightSearchResponse])
-async def list_freight_searches(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(FreightSearch))
-    return result.scalars().all()
-
-
-@app.get("/freight/{freight_id}/find_matches/", response_model=List[FreightSearchResponse])
-async def find_matches(
-    freight_id: int,
+@app.get("/freight_searches/", response_class=ORJSONResponse)
+async def list_freight_searches(
     db: AsyncSession = Depends(get_db),
-    response: Response = None,
-    limit: int = Query(200, ge=1, le=1000),
-    # OFFSET is still supported, but keyset is preferred for deep paging
+    limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
-    # Keyset cursor: fetch rows BEFORE this (created_at, id) pair
-    before_ts: Optional[datetime] = Query(None, description="ISO timestamp cursor for keyset paging"),
-    before_id: Optional[int] = Query(None, description="ID cursor for keyset paging"),
 ):
-    freight_obj = await db.get(Freight, freight_id)
-    if not freight_obj:
-        raise HTTPException(status_code=404, detail="Freight not found")
+    result = await db.execute(
+        select(*_FREIGHT_SEARCH_COLUMNS).order_by(FreightSearch.id).limit(limit).offset(offset)
+    )
+    return ORJSONResponse([dict(r) for r in result.mappings()])
+
 
-    # Route: IN ([value, NULL]) is a micro-optimization vs chained ORs
+def _build_match_stmt(keyset: bool = False, paged: bool = False):
+    """Build the find_matches SELECT once; per request only bind values change."""
+    # Route: explicit IS NULL / equality OR. IN ([value, NULL]) never matches
+    # NULL codes, and the split lets the planner BitmapOr the partial
+    # "IS NULL" indexes with the equality lookup
     route_conds = [
-        FreightSearch.pickup_code.in_([freight_obj.pickup_code, None]),
-        FreightSearch.delivery_code.in_([freight_obj.delivery_code, None]),
+        or_(FreightSearch.pickup_code.is_(None), FreightSearch.pickup_code == bindparam("pc")),
+        or_(FreightSearch.delivery_code.is_(None), FreightSearch.delivery_code == bindparam("dc")),
     ]
 
     # Price & date bounds: keep nullable means "no constraint" semantics
     price_conds = [
-        or_(FreightSearch.min_price.is_(None), FreightSearch.min_price <= freight_obj.price),
-        or_(FreightSearch.max_price.is_(None), FreightSearch.max_price >= freight_obj.price),
+        or_(FreightSearch.min_price.is_(None), FreightSearch.min_price <= bindparam("price")),
+        or_(FreightSearch.max_price.is_(None), FreightSearch.max_price >= bindparam("price")),
     ]
     pickup_conds = [
-        or_(FreightSearch.pickup_date_from.is_(None), FreightSearch.pickup_date_from <= freight_obj.pickup_date),
-        or_(FreightSearch.pickup_date_to.is_(None),   FreightSearch.pickup_date_to   >= freight_obj.pickup_date),
+        or_(FreightSearch.pickup_date_from.is_(None), FreightSearch.pickup_date_from <= bindparam("pd")),
+        or_(FreightSearch.pickup_date_to.is_(None),   FreightSearch.pickup_date_to   >= bindparam("pd")),
     ]
     delivery_conds = [
-        or_(FreightSearch.delivery_date_from.is_(None), FreightSearch.delivery_date_from <= freight_obj.delivery_date),
-        or_(FreightSearch.delivery_date_to.is_(None),   FreightSearch.delivery_date_to   >= freight_obj.delivery_date),
+        or_(FreightSearch.delivery_date_from.is_(None), FreightSearch.delivery_date_from <= bindparam("dd")),
+        or_(FreightSearch.delivery_date_to.is_(None),   FreightSearch.delivery_date_to   >= bindparam("dd")),
     ]
 
     conds = [*route_conds, *price_conds, *pickup_conds, *delivery_conds]
 
     # Keyset predicate: (created_at, id) < (before_ts, before_id) in DESC order
     # i.e., earlier than the last row from previous page
-    if before_ts is not None and before_id is not None:
+    if keyset:
         conds.append(
             or_(
-                FreightSearch.created_at < before_ts,
-                and_(FreightSearch.created_at == before_ts, FreightSearch.id < before_id),
+                FreightSearch.created_at < bindparam("bts"),
+                and_(FreightSearch.created_at == bindparam("bts"), FreightSearch.id < bindparam("bid")),
             )
         )
 
-    base = select(FreightSearch).where(*conds)
-
-    query = (
-        base.order_by(FreightSearch.created_at.desc(), FreightSearch.id.desc())
-            .limit(limit)
-            .offset(offset)  # for compatibility; prefer keyset for deep pages
+    stmt = (
+        select(*_FREIGHT_SEARCH_COLUMNS)
+            .where(*conds)
+            .order_by(FreightSearch.created_at.desc(), FreightSearch.id.desc())
+            .limit(bindparam("lim", type_=Integer))
     )
+    if paged:
+        stmt = stmt.offset(bindparam("off", type_=Integer))
+    return stmt
+
+
+# Freights have no update endpoint and the matcher is hammered with the same
+# ids, so keep their match parameters in a per-worker LRU with a short TTL
+_FREIGHT_CACHE_SIZE = 10_000
+_FREIGHT_CACHE_TTL = 60.0
+_freight_cache: "OrderedDict[int, tuple[float, dict]]" = OrderedDict()
+
+
+async def _get_freight_params(db: AsyncSession, freight_id: int) -> Optional[dict]:
+    """Bind values describing a freight for the match statements, or None if missing."""
+    now = time.monotonic()
+    hit = _freight_cache.get(freight_id)
+    if hit is not None and hit[0] > now:
+        _freight_cache.move_to_end(freight_id)
+        return hit[1]
+
+    freight_obj = await db.get(Freight, freight_id)
+    if not freight_obj:
+        return None
+    params = {
+        "pc": freight_obj.pickup_code,
+        "dc": freight_obj.delivery_code,
+        "price": freight_obj.price,
+        "pd": freight_obj.pickup_date,
+        "dd": freight_obj.delivery_date,
+    }
+    _freight_cache[freight_id] = (now + _FREIGHT_CACHE_TTL, params)
+    _freight_cache.move_to_end(freight_id)
+    if len(_freight_cache) > _FREIGHT_CACHE_SIZE:
+        _freight_cache.popitem(last=False)
+    return params
+
+
+# Response keys, in select order
+_MATCH_KEYS = tuple(c.key for c in _FREIGHT_SEARCH_COLUMNS)
+
+# Statement shape never changes, so build the clause trees at import time
+_MATCH_STMT = _build_match_stmt()
+_MATCH_KEYSET_STMT = _build_match_stmt(keyset=True)
+_MATCH_OFFSET_STMT = _build_match_stmt(paged=True)
+
+
+# Hot path: rows come from typed columns, so skip response_model validation and
+# jsonable_encoder and serialize plain dicts straight through orjson
+@app.get("/freight/{freight_id}/find_matches/", response_class=ORJSONResponse)
+async def find_matches(
+    freight_id: int,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(200, ge=1, le=1000),
+    # OFFSET is still supported, but ignored once a keyset cursor is given
+    offset: int = Query(0, ge=0),
+    # Keyset cursor: fetch rows BEFORE this (created_at, id) pair
+    before_ts: Optional[datetime] = Query(None, description="ISO timestamp cursor for keyset paging"),
+    before_id: Optional[int] = Query(None, description="ID cursor for keyset paging"),
+):
+    freight_params = await _get_freight_params(db, freight_id)
+    if freight_params is None:
+        raise HTTPException(status_code=404, detail="Freight not found")
 
-    result = await db.execute(query)
-    rows = result.scalars().all()
+    params = {**freight_params, "lim": limit}
+    # OFFSET only for legacy callers without a cursor: the keyset page and the
+    # first page never make the database scan and discard skipped rows
+    if before_ts is not None and before_id is not None:
+        query = _MATCH_KEYSET_STMT
+        params["bts"] = before_ts
+        params["bid"] = before_id
+    elif offset:
+        query = _MATCH_OFFSET_STMT
+        params["off"] = offset
+    else:
+        query = _MATCH_STMT
+
+    # Settings are scoped to the session's current transaction, which is
+    # rolled back when get_db closes it: no effect on other requests
+    hints = getattr(app.state, "planner_hints", None)
+    if hints is not None:
+        await db.execute(hints)
+
+    result = await db.execute(query, params)
+    # Plain row tuples zipped with the precomputed keys: no RowMapping per row,
+    # and the whole page is encoded in one orjson call
+    rows = result.all()
+    body = orjson.dumps([dict(zip(_MATCH_KEYS, r)) for r in rows])
 
     # Expose next-keyset cursor via headers if page is full
-    if response is not None and len(rows) == limit:
+    headers = {}
+    if len(rows) == limit:
         last = rows[-1]
         # Safe for query params; ISO 8601 plus integer id
-        response.headers["X-Next-Before-Ts"] = last.created_at.isoformat()
-        response.headers["X-Next-Before-Id"] = str(last.id)
+        headers["X-Next-Before-Ts"] = last.created_at.isoformat()
+        headers["X-Next-Before-Id"] = str(last.id)
 
-    return rows
+    return Response(body, media_type="application/json", headers=headers)
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # loop/http default to "auto": uvloop + httptools when installed (not on
+    # Windows), asyncio + h11 otherwise
+    uvicorn.run(app, host="0.0.0.0", port=8000, access_log=False)
@@ -13,76 +13,76 @@ from database import AsyncSessionLocal
 from models import FreightSearch
 from sqlalchemy import insert
 
-def pct(values, p):
-    if not values:
+def pct(sorted_values, p):
+    """Percentile of an already sorted list (sort once, not per percentile)."""
+    if not sorted_values:
         return 0.0
-    idx = max(0, min(len(values)-1, int(len(values) * p)))
-    return sorted(values)[idx]
+    idx = max(0, min(len(sorted_values)-1, int(len(sorted_values) * p)))
+    return sorted_values[idx]
+
+SEED_COLUMNS = [
+    "user_id", "min_price", "max_price", "pickup_code", "delivery_code",
+    "pickup_date_from", "pickup_date_to", "delivery_date_from", "delivery_date_to",
+]
+
+async def insert_batch(session, rows):
+    """Insert tuples ordered as SEED_COLUMNS; binary COPY on PostgreSQL."""
+    if session.bind.dialect.name == "postgresql":
+        # COPY skips per-statement parse/plan and encodes rows in asyncpg's binary protocol
+        conn = await session.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            FreightSearch.__tablename__, records=rows, columns=SEED_COLUMNS
+        )
+    else:
+        await session.execute(insert(FreightSearch), [dict(zip(SEED_COLUMNS, r)) for r in rows])
+
+LANES = [(10100, 20100), (10100, 20200), (10200, 20300), (10300, 20400)]
+MIN_PRICES = [None, 150.0, 200.0, 250.0]
+MAX_PRICES = [None, 350.0, 400.0, 450.0, 600.0]  # all above MIN_PRICES, no swap needed
+BASE_PICKUP = date(2022, 1, 1)
+BASE_DELIVERY = date(2022, 1, 2)
+# Windows open 0-3 days before and close 0-3 days after the base date
+PICKUP_FROM = [BASE_PICKUP - timedelta(days=d) for d in range(4)]
+PICKUP_TO = [BASE_PICKUP + timedelta(days=d) for d in range(4)]
+DELIVERY_FROM = [BASE_DELIVERY - timedelta(days=d) for d in range(4)]
+DELIVERY_TO = [BASE_DELIVERY + timedelta(days=d) for d in range(4)]
+
+def build_rows(n):
+    """Generate n seed tuples column by column: one random.choices call per column, not per row."""
+    choices = random.choices
+    # 80% on one of the 4 lanes, 20% no route constraint
+    routes = choices(LANES + [(None, None)], k=n)
+    # Bounds are present with 90% (price) / 85% (date windows) probability
+    has_price = choices((True, False), weights=(90, 10), k=n)
+    has_pickup = choices((True, False), weights=(85, 15), k=n)
+    has_delivery = choices((True, False), weights=(85, 15), k=n)
+    columns = zip(
+        routes, has_price, choices(MIN_PRICES, k=n), choices(MAX_PRICES, k=n),
+        has_pickup, choices(PICKUP_FROM, k=n), choices(PICKUP_TO, k=n),
+        has_delivery, choices(DELIVERY_FROM, k=n), choices(DELIVERY_TO, k=n),
+    )
+    return [
+        (
+            1,  # user_id; assumes sample user exists
+            min_p if hp else None, max_p if hp else None,
+            pickup_code, delivery_code,
+            p_from if hpk else None, p_to if hpk else None,
+            d_from if hd else None, d_to if hd else None,
+        )
+        for (pickup_code, delivery_code), hp, min_p, max_p, hpk, p_from, p_to, hd, d_from, d_to in columns
+    ]
 
 async def seed_searches(total_rows: int, batch_size: int = 5000):
     """Bulk-insert many FreightSearch rows quickly."""
     print(f"[seed] Seeding {total_rows:,} freight_searches in batches of {batch_size}...")
     start = time.perf_counter()
-    lanes = [(10100, 20100), (10100, 20200), (10200, 20300), (10300, 20400)]
-    base_pickup = date(2022, 1, 1)
-    base_delivery = date(2022, 1, 2)
 
     inserted = 0
     async with AsyncSessionLocal() as session:
         while inserted < total_rows:
             rows = min(batch_size, total_rows - inserted)
-            payload = []
-            for _ in range(rows):
-                # Some rows with exact lanes, some with no constraints
-                if random.random() < 0.8:
-                    pickup_code, delivery_code = random.choice(lanes)
-                else:
-                    pickup_code = None
-                    delivery_code = None
-
-                # Price bounds with occasional NULLs
-                if random.random() < 0.9:
-                    min_price = random.choice([None, 150.0, 200.0, 250.0])
-                    max_price = random.choice([None, 350.0, 400.0, 450.0, 600.0])
-                    if min_price and max_price and max_price < min_price:
-                        min_price, max_price = max_price, min_price
-                else:
-                    min_price = None
-                    max_price = None
-
-                # Pickup window with occasional NULLs
-                if random.random() < 0.85:
-                    p_from = base_pickup - timedelta(days=random.randint(0, 3))
-                    p_to   = base_pickup + timedelta(days=random.randint(0, 3))
-                    if p_to < p_from:
-                        p_from, p_to = p_to, p_from
-                else:
-                    p_from = None
-                    p_to = None
-
-                # Delivery window with occasional NULLs
-                if random.random() < 0.85:
-                    d_from = base_delivery - timedelta(days=random.randint(0, 3))
-                    d_to   = base_delivery + timedelta(days=random.randint(0, 3))
-                    if d_to < d_from:
-                        d_from, d_to = d_to, d_from
-                else:
-                    d_from = None
-                    d_to = None
-
-                payload.append({
-                    "user_id": 1,  # assumes sample user exists
-                    "min_price": min_price,
-                    "max_price": max_price,
-                    "pickup_code": pickup_code,
-                    "delivery_code": delivery_code,
-                    "pickup_date_from": p_from,
-                    "pickup_date_to": p_to,
-                    "delivery_date_from": d_from,
-                    "delivery_date_to": d_to,
-                })
-
-            await session.execute(insert(FreightSearch), payload)
+            await insert_batch(session, build_rows(rows))
             await session.commit()
             inserted += rows
             if inserted % (batch_size * 5) == 0 or inserted == total_rows:
@@ -108,9 +108,9 @@ async def ensure_freight_exists(client):
         r2.raise_for_status()
         print("[seed] Created default freight:", r2.json())
 
-async def one_request(client, freight_id, limit, stats):
+async def one_request(client, request, stats):
     t0 = time.perf_counter()
-    resp = await client.get(f"/freight/{freight_id}/find_matches/?limit={limit}")
+    resp = await client.send(request)
     dt = time.perf_counter() - t0
     if resp.status_code == 200:
         stats.append(dt)
@@ -118,16 +118,20 @@ async def one_request(client, freight_id, limit, stats):
 async def _drive(client, requests, concurrency, freight_id, limit):
     stats = []
     sem = asyncio.Semaphore(concurrency)
+    # Built once and re-sent: no URL parsing / header merging per request.
+    # Safe to share, a bodiless GET request is never mutated by send()
+    request = client.build_request("GET", f"/freight/{freight_id}/find_matches/", params={"limit": limit})
 
     async def worker():
         async with sem:
-            await one_request(client, freight_id, limit, stats)
+            await one_request(client, request, stats)
 
     t0 = time.perf_counter()
     await asyncio.gather(*(worker() for _ in range(requests)))
     dur = time.perf_counter() - t0
 
     if stats:
+        stats.sort()
         avg = statistics.mean(stats)
         p50 = pct(stats, 0.50)
         p90 = pct(stats, 0.90)
@@ -148,7 +152,10 @@ async def run_load(base_url, requests, concurrency, freight_id=1, limit=200, inp
             await ensure_freight_exists(client)
             await _drive(client, requests, concurrency, freight_id, limit)
     else:
-        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        # httpx pools 100 connections by default; size it to the concurrency so
+        # workers don't queue on the client instead of the server
+        limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
             await ensure_freight_exists(client)
             await _drive(client, requests, concurrency, freight_id, limit)
 
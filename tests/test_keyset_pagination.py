@@ -19,3 +19,39 @@ async def test_keyset_headers_present():
             assert r.status_code == 200
             assert "X-Next-Before-Ts" in r.headers
             assert "X-Next-Before-Id" in r.headers
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_do_not_overlap():
+    async with lifespan(server.app):
+        async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://testserver") as client:
+            for _ in range(3):
+                r = await client.post("/freight_searches/", json={"user_id": 1, "pickup_code": 10100, "delivery_code": 20100})
+                assert r.status_code == 200
+            first = await client.get("/freight/1/find_matches/?limit=2")
+            assert first.status_code == 200
+            params = {
+                "limit": 2,
+                "before_ts": first.headers["X-Next-Before-Ts"],
+                "before_id": first.headers["X-Next-Before-Id"],
+            }
+            second = await client.get("/freight/1/find_matches/", params=params)
+            assert second.status_code == 200
+            first_ids = [m["id"] for m in first.json()]
+            second_ids = [m["id"] for m in second.json()]
+            assert second_ids
+            assert not set(first_ids) & set(second_ids)
+            assert max(second_ids) < min(first_ids)
+
+
+@pytest.mark.asyncio
+async def test_offset_paging_still_supported():
+    async with lifespan(server.app):
+        async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://testserver") as client:
+            for _ in range(2):
+                r = await client.post("/freight_searches/", json={"user_id": 1, "pickup_code": 10100, "delivery_code": 20100})
+                assert r.status_code == 200
+            both = await client.get("/freight/1/find_matches/?limit=2")
+            second = await client.get("/freight/1/find_matches/?limit=1&offset=1")
+            assert both.status_code == 200 and second.status_code == 200
+            assert [m["id"] for m in second.json()] == [both.json()[1]["id"]]
@@ -50,4 +50,45 @@ async def test_no_match():
 
             resp = await client.get("/freight/1/find_matches/")
             assert resp.status_code == 200
-            assert all(m.get("pickup_code") != 99999 for m in resp.json())
\ No newline at end of file
+            assert all(m.get("pickup_code") != 99999 for m in resp.json())
+
+@pytest.mark.asyncio
+async def test_match_without_route_constraint():
+    async with lifespan(server.app):
+        async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://testserver") as client:
+            # NULL pickup/delivery codes mean "any lane"
+            resp = await client.post("/freight_searches/", json={"user_id": 1})
+            assert resp.status_code == 200
+            search_id = resp.json()["id"]
+
+            resp = await client.get("/freight/1/find_matches/")
+            assert resp.status_code == 200
+            assert any(m["id"] == search_id for m in resp.json())
+
+
+@pytest.mark.asyncio
+async def test_list_freight_searches_is_paginated():
+    async with lifespan(server.app):
+        async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://testserver") as client:
+            for _ in range(3):
+                resp = await client.post("/freight_searches/", json={"user_id": 1})
+                assert resp.status_code == 200
+
+            first = await client.get("/freight_searches/?limit=2")
+            second = await client.get("/freight_searches/?limit=2&offset=2")
+            assert first.status_code == 200 and second.status_code == 200
+            assert len(first.json()) == 2
+            first_ids = [s["id"] for s in first.json()]
+            assert all(s["id"] > max(first_ids) for s in second.json())
+
+            resp = await client.get("/freight_searches/?limit=1001")
+            assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_unknown_freight_returns_404():
+    async with lifespan(server.app):
+        async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://testserver") as client:
+            for _ in range(2):  # second call must not be served from the freight cache
+                resp = await client.get("/freight/999999/find_matches/")
+                assert resp.status_code == 404
@@ -4,33 +4,86 @@ import pytest
 from httpx import ASGITransport, AsyncClient
 
 from server import app
-from database import AsyncSessionLocal
+from database import DATABASE_URL, AsyncSessionLocal, engine
 from models import FreightSearch
-from sqlalchemy import insert
+from stress_test import SEED_COLUMNS
+from sqlalchemy import func, insert, make_url, select
+
+# In-flight cap for the 500 calls: unbounded gather mostly measures contention
+# on the DB pool, which makes the regression signal noisy
+CONCURRENCY = 50
+SEED_CHUNK = 1000
+
+# Reseed only when the table is clearly short of a previous seed
+SEED_ROWS = 20_000  # keep small for CI
+SEED_MIN_EXISTING = 19_000
+
+@pytest.fixture(scope="module")
+def event_loop_policy():
+    # uvloop for this module's heavy fan-out; stdlib loop where it is unavailable (Windows)
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
+
+def _seed_rows():
+    # One comprehension of tuples (no per-row dict); date windows are all NULL
+    no_dates = (None, None, None, None)
+    return [
+        (
+            1,
+            None if i % 3 else 200.0,
+            None if i % 5 else 400.0,
+            None if i & 1 else 10100,
+            None if i & 3 else 20100,
+            *no_dates,
+        )
+        for i in range(SEED_ROWS)
+    ]
+
+async def _seed_postgres():
+    # Plain asyncpg connection: no session, compile cache or result setup for a pure data load
+    import asyncpg
+
+    # libpq-style DSN without SQLAlchemy query options: asyncpg would pass unknown
+    # ones (e.g. prepared_statement_cache_size) to the server as startup settings
+    dsn = make_url(DATABASE_URL).set(drivername="postgresql", query={})
+    conn = await asyncpg.connect(dsn.render_as_string(hide_password=False))
+    try:
+        count = await conn.fetchval(f"SELECT count(*) FROM {FreightSearch.__tablename__}")
+        if count < SEED_MIN_EXISTING:
+            # COPY FROM STDIN: one streaming load instead of INSERT batches
+            await conn.copy_records_to_table(
+                FreightSearch.__tablename__, records=_seed_rows(), columns=SEED_COLUMNS
+            )
+    finally:
+        await conn.close()
+
+async def _seed_sqlite():
+    # begin(): one transaction around the whole seed, committed once on exit
+    async with AsyncSessionLocal.begin() as session:
+        count = (await session.execute(select(func.count()).select_from(FreightSearch))).scalar_one()
+        if count < SEED_MIN_EXISTING:
+            rows = _seed_rows()
+            # No COPY: multi-row INSERT ... VALUES in pages of SEED_CHUNK rows
+            # (9 params/row stays well under SQLite's 32766 bind limit)
+            for start in range(0, len(rows), SEED_CHUNK):
+                chunk = [dict(zip(SEED_COLUMNS, r)) for r in rows[start:start + SEED_CHUNK]]
+                await session.execute(insert(FreightSearch).values(chunk))
+    # Pooled connections belong to this throwaway loop, drop them before the test loop starts
+    await engine.dispose()
+
+@pytest.fixture(scope="session")
+def seeded_db():
+    #Seed ~20k rows once per session, and not at all when a previous run already did
+    # Sync fixture on its own loop: async fixtures break on the pinned pytest 8.2 / pytest-asyncio 0.23 pair
+    asyncio.run(_seed_postgres() if engine.dialect.name == "postgresql" else _seed_sqlite())
 
 @pytest.mark.stress
 @pytest.mark.asyncio
-async def test_stress_smoke():
-    #Seed ~20k rows and do 500 requests in-process, not a heavy benchmark is just a guard against regressions
-    #Sed a modest number quickly
-    async with AsyncSessionLocal() as session:
-        rows = []
-        for i in range(20_000):  # keep small for CI
-            rows.append({
-                "user_id": 1,
-                "min_price": None if i % 3 else 200.0,
-                "max_price": None if i % 5 else 400.0,
-                "pickup_code": 10100 if i % 2 == 0 else None,
-                "delivery_code": 20100 if i % 4 == 0 else None,
-                "pickup_date_from": None,
-                "pickup_date_to": None,
-                "delivery_date_from": None,
-                "delivery_date_to": None,
-            })
-        await session.execute(insert(FreightSearch), rows)
-        await session.commit()
-
-    #Drive 500 requests concurrently
+async def test_stress_smoke(seeded_db):
+    #Do 500 requests in-process against the seeded table, not a heavy benchmark is just a guard against regressions
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://testserver") as client:
         # create freight if missing
@@ -44,8 +97,39 @@ async def test_stress_smoke():
                 "delivery_date": "2022-01-02"
             })
 
-        async def call():
-            r = await client.get("/freight/1/find_matches/?limit=200")
-            assert r.status_code == 200
+    #Drive 500 requests, CONCURRENCY at a time, straight into the ASGI app: no httpx
+    #Request/Response objects or header parsing per call
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/freight/1/find_matches/",
+        "raw_path": b"/freight/1/find_matches/",
+        "query_string": b"limit=200",
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+        "client": ("test", 0),
+    }
+    request = {"type": "http.request", "body": b"", "more_body": False}
+
+    async def receive():
+        return request
+
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    async def call():
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        # fresh copy: the app stores per-request state in the scope
+        async with sem:
+            await app(dict(scope), receive, send)
+        assert messages[0]["type"] == "http.response.start"
+        assert messages[0]["status"] == 200
 
-        await asyncio.gather(*(call() for _ in range(500)))
+    await asyncio.gather(*(call() for _ in range(500)))
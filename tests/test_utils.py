@@ -0,0 +1,182 @@
+# tests/test_utils.py
+import asyncio
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils import _filename, api_call, close_clients, drain
+
+
+def mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://testserver")
+
+
+@pytest.mark.asyncio
+async def test_drain_returns_body_and_closes_response():
+    body = b"x" * 100_000
+
+    async def chunks():
+        for start in range(0, len(body), 16_384):
+            yield body[start:start + 16_384]
+
+    def handler(request):
+        # Iterator content keeps the mock response unread, like a real stream
+        return httpx.Response(200, content=chunks(), headers={
+            "content-type": "application/octet-stream",
+            "content-disposition": 'attachment; filename="report.bin"',
+        })
+
+    async with mock_client(handler) as client:
+        response, data = await api_call("get", "/report", client=client)
+        assert data["filename"] == "report.bin"
+        assert not response.is_closed
+        assert await drain(data) == body
+        assert response.is_closed
+
+
+@pytest.mark.asyncio
+async def test_non_json_error_page_is_closed():
+    def handler(request):
+        return httpx.Response(404, text="<h1>Not Found</h1>", headers={"content-type": "text/html"})
+
+    async with mock_client(handler) as client:
+        response, data = await api_call("get", "/missing", client=client)
+        assert data is None
+        assert response.is_closed
+        assert response.text == "<h1>Not Found</h1>"
+
+
+class _KeepAliveJSON(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the client pools the connection
+
+    def do_GET(self):
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_cached_client_survives_separate_event_loops():
+    # Real sockets: pooled connections are bound to the loop that opened them
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveJSON)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    async def call():
+        return await api_call("get", "/x", base_url=base_url, retries=1)
+
+    try:
+        for _ in range(2):
+            response, data = asyncio.run(call())
+            assert response.status_code == 200
+            assert data == {"ok": True}
+        asyncio.run(close_clients())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def scripted(*outcomes):
+    """Handler replaying outcomes in order: a status code, or an exception class to raise."""
+    calls = []
+
+    def handler(request):
+        outcome = outcomes[len(calls)]
+        calls.append(request)
+        if isinstance(outcome, type):
+            raise outcome("scripted failure", request=request)
+        return httpx.Response(outcome, json={"status": outcome})
+
+    return handler, calls
+
+
+@pytest.mark.asyncio
+async def test_retries_5xx_then_succeeds():
+    handler, calls = scripted(503, 200)
+    async with mock_client(handler) as client:
+        response, data = await api_call("get", "/x", client=client, backoff_factor=0)
+    assert response.status_code == 200
+    assert data == {"status": 200}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_retries_transport_error_then_succeeds():
+    handler, calls = scripted(httpx.ReadTimeout, 200)
+    async with mock_client(handler) as client:
+        response, _ = await api_call("get", "/x", client=client, backoff_factor=0)
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_last_5xx_is_returned():
+    handler, calls = scripted(500, 502, 503)
+    async with mock_client(handler) as client:
+        response, data = await api_call("get", "/x", client=client, retries=3, backoff_factor=0)
+    assert response.status_code == 503
+    assert data == {"status": 503}
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_4xx_is_not_retried():
+    handler, calls = scripted(422)
+    async with mock_client(handler) as client:
+        response, _ = await api_call("get", "/x", client=client, backoff_factor=0)
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_post_not_retried_after_it_may_have_been_applied():
+    handler, calls = scripted(500)
+    async with mock_client(handler) as client:
+        response, _ = await api_call("post", "/x", payload={"a": 1}, client=client, backoff_factor=0)
+    assert response.status_code == 500
+    assert len(calls) == 1
+
+    handler, calls = scripted(httpx.ReadTimeout)
+    async with mock_client(handler) as client:
+        with pytest.raises(httpx.ReadTimeout):
+            await api_call("post", "/x", payload={"a": 1}, client=client, backoff_factor=0)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_post_retried_on_connect_error():
+    handler, calls = scripted(httpx.ConnectError, 201)
+    async with mock_client(handler) as client:
+        response, _ = await api_call("post", "/x", payload={"a": 1}, client=client, backoff_factor=0)
+    assert response.status_code == 201
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('attachment; filename="report.pdf"', "report.pdf"),
+    ("attachment; filename=report.csv; size=3", "report.csv"),
+    ('attachment; filename=""', ""),
+    ("attachment; filename*=UTF-8''na%C3%AFve%20file.txt", "naïve file.txt"),
+    ("attachment; filename*=UTF-8'en'file%20x.txt", "file x.txt"),
+    ("attachment; filename*=iso-8859-1''caf%E9.txt", "café.txt"),
+    ("attachment; filename=\"plain.txt\"; filename*=UTF-8''fancy%20name.txt", "fancy name.txt"),
+    ('attachment; FILENAME="a.txt"', "a.txt"),
+    ("attachment; Filename=a.txt", "a.txt"),
+    ('attachment; filename = "a.txt"', "a.txt"),
+    ('attachment; filename="a\\"b.txt"', 'a"b.txt'),
+    ('attachment; xfilename="evil"; filename="good.txt"', "good.txt"),
+    ("inline", None),
+])
+def test_content_disposition_filename(header, expected):
+    assert _filename(header) == expected
@@ -1,66 +1,145 @@
 # utils.py
 import asyncio
-from email.message import Message
 import json
+import random
+import re
+from urllib.parse import unquote
 import httpx
-from pydantic import TypeAdapter
+from pydantic import BaseModel
+
+# Long-lived clients keyed by (base_url, app): reusing one keeps httpx's connection
+# pool (or the ASGI transport) alive across calls instead of rebuilding it per request.
+# Each is stored with the event loop that owns its pooled connections
+_CLIENTS: dict[tuple[str, int], tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=500)
+_METHODS = frozenset(("get", "post", "put", "delete", "patch"))
+# May already have been applied when a response is lost: retried only when the
+# request never reached the server
+_NON_IDEMPOTENT = frozenset(("post", "patch"))
+# Content-Disposition filename parameter (case-insensitive name, anchored at a
+# ";" so e.g. xfilename= is skipped): quoted with backslash escapes (possibly
+# empty) or bare; filename* carries charset'lang'pct-encoded (RFC 5987)
+_FILENAME_RE = re.compile(
+    r'(?:^|;)\s*filename(\*?)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;]*))', re.IGNORECASE
+)
+_QUOTED_PAIR_RE = re.compile(r'\\(.)')
+
+
+def _get_client(base_url, app):
+    key = (base_url, id(app))
+    loop = asyncio.get_running_loop()
+    cached = _CLIENTS.get(key)
+    # A client left by an earlier asyncio.run() holds connections bound to a
+    # closed loop: drop it rather than reuse it (it can't be closed from here)
+    if cached is None or cached[1] is not loop or cached[0].is_closed:
+        transport = None if not app else httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(base_url=base_url, transport=transport, limits=_LIMITS)
+        _CLIENTS[key] = (client, loop)
+        return client
+    return cached[0]
+
+
+def _filename(content_disposition):
+    filename = None
+    for star, quoted, bare in _FILENAME_RE.findall(content_disposition):
+        # Only one alternative matches; an empty quoted value stays ""
+        value = _QUOTED_PAIR_RE.sub(r"\1", quoted) if quoted else bare.strip()
+        if not star:
+            # filename* wins over a plain filename given alongside it (RFC 6266)
+            if filename is None:
+                filename = value
+            continue
+        charset, _, value = value.split("'", 2) if value.count("'") >= 2 else ("", "", value)
+        try:
+            return unquote(value, encoding=charset or "utf-8")
+        except LookupError:  # unknown charset label
+            return unquote(value)
+    return filename
+
+
+async def close_clients():
+    """Close the cached clients owned by the running loop; call once on shutdown."""
+    loop = asyncio.get_running_loop()
+    clients = [client for client, owner in _CLIENTS.values() if owner is loop]
+    _CLIENTS.clear()
+    await asyncio.gather(*(c.aclose() for c in clients))
+
 
 async def api_call(method, url, payload=None, params=None, headers=None, files=None, base_url='',
-                   timeout: int = 10, retries: int = 3, backoff_factor: float = 0.5, app=None):
-    transport = None if not app else httpx.ASGITransport(app=app)
-    async with httpx.AsyncClient(base_url=base_url, transport=transport) as ac:
-        call_map = {
-            "get": ac.get,
-            "post": ac.post,
-            "put": ac.put,
-            "delete": ac.delete,
-            "patch": ac.patch
-        }
-        
-        if method not in call_map:
-            raise ValueError(f"Unsupported API type: {method}")
+                   timeout: int = 10, retries: int = 3, backoff_factor: float = 0.5, app=None, client=None):
+    # An injected client wins; otherwise share the cached one for this base_url/app
+    ac = client if client is not None else _get_client(base_url, app)
+    if method not in _METHODS:
+        raise ValueError(f"Unsupported API type: {method}")
+
+    # Some methods might not accept 'json' argument when it's None (like GET, DELETE). so i conditionally pass arguments based on the method.
+    if files is not None:
+        kwargs = {"data": payload or None, "files": files}
+    elif payload is not None:
+        # dicts go to httpx's json= as-is; only pydantic models need dumping
+        if isinstance(payload, BaseModel):
+            payload = payload.model_dump(mode="json")
+        elif isinstance(payload, (list, tuple)) and len(payload) and isinstance(payload[0], BaseModel):
+            payload = [p.model_dump(mode="json") for p in payload]
+        kwargs = {"json": payload}
+    else:
+        kwargs = {"params": params}
+    # Built once, outside the retry loop
+    request = ac.build_request(method.upper(), url, headers=headers, timeout=timeout, **kwargs)
+    idempotent = method not in _NON_IDEMPOTENT
+    # connect/read/write errors and timeouts; only connect failures for POST/PATCH
+    retry_on = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
 
-        # Some methods might not accept 'json' argument when it's None (like GET, DELETE). so i conditionally pass arguments based on the method.
-        for attempt in range(retries):
-            try:
-                if files is not None:
-                    data = None
-                    if payload:
-                        data = payload
-                    response = await call_map[method](url, headers=headers, data=data, files=files, timeout=timeout)
-                elif payload is not None:
-                    if isinstance(payload, dict):
-                        payload = TypeAdapter(dict).dump_python(payload)
-                    elif isinstance(payload, (list, tuple)) and len(payload) and isinstance(payload[0], dict):
-                        payload = [TypeAdapter(dict).dump_python(d) for d in payload]
-                    response = await call_map[method](url, headers=headers, json=payload, timeout=timeout)
-                else:
-                    response = await call_map[method](url, headers=headers, params=params, timeout=timeout)
+    for attempt in range(retries):
+        try:
+            # Streamed: JSON bodies are read below, binary bodies are handed to
+            # the caller unread so large downloads never sit in memory whole
+            response = await ac.send(request, stream=True)
+            # 5xx is worth another attempt on idempotent methods; the last one is returned as-is
+            if response.status_code < 500 or not idempotent or attempt + 1 == retries:
                 break
-            except httpx.HTTPStatusError as e:
-                print(f"Attempt {attempt + 1}/{retries} failed with status {e.response.status_code}: {e.response.text}")
-                if attempt + 1 == retries:
-                    raise
-                await asyncio.sleep(backoff_factor) 
+            await response.aclose()
+            print(f"Attempt {attempt + 1}/{retries} failed with status {response.status_code}")
+        except retry_on as e:
+            print(f"Attempt {attempt + 1}/{retries} failed: {e!r}")
+            if attempt + 1 == retries:
+                raise
+        # Exponential backoff with jitter so concurrent callers don't retry in lockstep
+        await asyncio.sleep(backoff_factor * (2 ** attempt) + random.random() * 0.05)
+
+    ctype = response.headers.get('content-type', '')
+    # Media type leads the header; parameters such as charset only follow it
+    is_json = ctype.startswith('application/json')
+    if is_json:
+        try:
+            await response.aread()
+            data = response.json()
+        except json.JSONDecodeError:
+            data = None
+        finally:
+            await response.aclose()
+    elif not response.is_success:
+        # Error pages (HTML/text) are small: buffer and release the connection
+        # here, callers often ignore data; response.text stays readable
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        data = None
+    else:
+        # Handle binary response
+        content_disposition = response.headers.get('Content-Disposition')
+        # Extract filename from Content-Disposition header if present
+        filename = _filename(content_disposition) if content_disposition else None
+        # Caller consumes "stream" (or calls drain) and must close "response"
+        data = {"filename":filename, "stream":response.aiter_bytes(), "response":response}
+
+    return response, data
 
-        if 'application/json' in response.headers.get('Content-Type', ''):
-            try:
-                if 'application/json' in response.headers.get('Content-Type', ''):
-                    data = response.json()
-                else:
-                    print(f"Unexpected Content-Type: {response.headers.get('Content-Type')}")
-            except json.JSONDecodeError as e:
-                data = None
-        else:
-            # Handle binary response
-            content_disposition = response.headers.get('Content-Disposition')
-            if content_disposition:
-                # Extract filename from Content-Disposition header if present
-                msg = Message()
-                msg['content-disposition'] = content_disposition
-                filename = msg.get_filename()
-            else:
-                filename = None
-            data = {"filename":filename, "content":response.content}
 
-    return response, data
\ No newline at end of file
+async def drain(data):
+    """Read a streamed binary api_call result fully and release its connection."""
+    try:
+        return b"".join([chunk async for chunk in data["stream"]])
+    finally:
+        await data["response"].aclose()
\ No newline at end of file